@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import os
+import re
 import sys
 import json
 import ssl
@@ -7,51 +8,86 @@ import shutil
 import platform
 import urllib.request
 import urllib.parse
+import urllib.error
 import subprocess
+import secrets
 import socket
+import struct
 import time
+import glob
+import asyncio
 import argparse
+from collections import namedtuple
+from functools import lru_cache
 from pathlib import Path
 import base64
 import random as rand_module  # 重命名导入避免冲突
 
+# aiohttp是可选依赖，没有的话回退到wget/curl/urllib
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+# orjson（C实现）可选，序列化配置比标准库json快得多
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# cryptography也是可选依赖，没有的话生成证书回退到openssl子进程
+try:
+    from cryptography import x509
+    from cryptography.x509.oid import NameOID
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    HAS_CRYPTOGRAPHY = True
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+
+# 模块加载时解析一次下载工具路径，避免每次调用都扫描$PATH
+_WGET = shutil.which('wget')
+_CURL = shutil.which('curl')
+
+# 所有urllib请求共用同一个opener，复用连接处理器而不是每次urlopen重建
+_OPENER = urllib.request.build_opener(urllib.request.HTTPSHandler())
+
+# 常用系统命令的绝对路径只解析一次；argv[0]是绝对路径时
+# subprocess可以走posix_spawn快路径，子进程里也不用再搜$PATH
+_BIN = {name: shutil.which(name) or f'/usr/bin/{name}'
+        for name in ('sudo', 'id', 'useradd', 'chown', 'chmod', 'cp', 'rm',
+                     'mkdir', 'find', 'tee', 'nginx', 'systemctl', 'openssl')}
+
+def _run(args, **kwargs):
+    """subprocess.run包装：把argv[0]替换成预解析的绝对路径"""
+    return subprocess.run([_BIN.get(args[0], args[0]), *args[1:]], **kwargs)
+
+@lru_cache(maxsize=None)
 def get_user_home():
     """获取用户主目录"""
     return str(Path.home())
 
+# 系统和架构在解释器启动时就定了，模块加载算一次即可：
+# sys.platform是常量字符串，指针大小区分amd64/386，arm只看machine名
+_OS = {'linux': 'linux', 'darwin': 'darwin', 'win32': 'windows', 'cygwin': 'windows'}.get(sys.platform, 'linux')
+_ARCH = ('arm64' if platform.machine().lower() in ('arm64', 'aarch64')
+         else ('amd64' if struct.calcsize('P') == 8 else '386'))
+
+# platform.system()在部分平台会探测uname，脚本生成函数共用这一份结果
+_OS_NAME = platform.system().lower()
+
 def get_system_info():
     """获取系统信息"""
-    system = platform.system().lower()
-    machine = platform.machine().lower()
-    
-    # 系统映射
-    os_map = {
-        'linux': 'linux',
-        'darwin': 'darwin',  # macOS
-        'windows': 'windows'
-    }
-    
-    # 架构映射
-    arch_map = {
-        'x86_64': 'amd64',
-        'amd64': 'amd64',
-        'aarch64': 'arm64',
-        'arm64': 'arm64',
-        'i386': '386',
-        'i686': '386'
-    }
-    
-    os_name = os_map.get(system, 'linux')
-    arch = arch_map.get(machine, 'amd64')
-    
-    return os_name, arch
+    return _OS, _ARCH
 
 def ensure_nginx_user():
     """确保nginx用户存在，如果不存在就创建，统一使用nginx用户"""
     try:
         # 检查nginx用户是否已存在
         try:
-            result = subprocess.run(['id', 'nginx'], check=True, capture_output=True, text=True)
+            result = _run(['id', 'nginx'], check=True, capture_output=True, text=True)
             if result.returncode == 0:
                 print("✅ nginx用户已存在")
                 return 'nginx'
@@ -61,7 +97,7 @@ def ensure_nginx_user():
             
             # 创建nginx系统用户（无登录shell，无家目录）
             try:
-                subprocess.run([
+                _run([
                     'sudo', 'useradd', 
                     '--system',           # 系统用户
                     '--no-create-home',   # 不创建家目录
@@ -77,7 +113,7 @@ def ensure_nginx_user():
                 
                 # 再次检查用户是否存在（可能是并发创建）
                 try:
-                    subprocess.run(['id', 'nginx'], check=True, capture_output=True)
+                    _run(['id', 'nginx'], check=True, capture_output=True)
                     print("✅ nginx用户实际上已存在")
                     return 'nginx'
                 except:
@@ -90,6 +126,11 @@ def ensure_nginx_user():
         # 出错时使用root用户
         return 'root'
 
+def _sudo_write(path, data):
+    """通过sudo tee从stdin写入文件，省掉临时文件和多一次cp的fork"""
+    _run(['sudo', 'tee', path], input=data,
+                   stdout=subprocess.DEVNULL, check=True)
+
 def set_nginx_permissions(web_dir):
     """设置nginx目录的正确权限"""
     try:
@@ -97,10 +138,10 @@ def set_nginx_permissions(web_dir):
         print(f"🔧 设置目录权限: {web_dir}")
         print(f"👤 使用用户: {nginx_user}")
         
-        # 设置目录和文件权限
-        subprocess.run(['sudo', 'chown', '-R', f'{nginx_user}:{nginx_user}', web_dir], check=True)
-        subprocess.run(['sudo', 'chmod', '-R', '755', web_dir], check=True)
-        subprocess.run(['sudo', 'find', web_dir, '-type', 'f', '-exec', 'chmod', '644', '{}', ';'], check=True)
+        # 设置目录和文件权限：大写X只给目录加执行位，
+        # 一条chmod -R等效于之前的chmod 755 + find -exec chmod 644（每个文件fork一次chmod）
+        _run(['sudo', 'chown', '-R', f'{nginx_user}:{nginx_user}', web_dir], check=True)
+        _run(['sudo', 'chmod', '-R', 'u=rwX,go=rX', web_dir], check=True)
         
         print(f"✅ 权限设置完成: {web_dir} (用户: {nginx_user})")
         return True
@@ -108,117 +149,162 @@ def set_nginx_permissions(web_dir):
         print(f"❌ 设置权限失败: {e}")
         return False
 
-def check_port_available(port):
-    """检查端口是否可用（仅使用socket）"""
+def _udp_bindable(port):
+    """单次bind探测UDP端口：能绑定说明端口空闲，绑不上说明已被占用"""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
-        # 对于Hysteria2，我们主要关心UDP端口
-        # nginx使用TCP端口，hysteria使用UDP端口，它们可以共存
-        
-        # 检查UDP端口是否可用（这是hysteria2需要的）
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-            s.settimeout(1)
-            try:
-                s.bind(('', port))
-                return True  # UDP端口可用
-            except:
-                # UDP端口被占用，检查是否是hysteria进程
-                return False
-                
-    except:
-        # 如果有任何异常，保守起见返回端口不可用
+        s.bind(('', port))
+        return True
+    except OSError:
         return False
+    finally:
+        s.close()
+
+def check_port_available(port):
+    """检查端口是否可用（仅使用socket）"""
+    # 对于Hysteria2，我们主要关心UDP端口
+    # nginx使用TCP端口，hysteria使用UDP端口，它们可以共存
+    return _udp_bindable(port)
 
 def is_port_listening(port):
     """检查端口是否已经在监听（服务是否已启动）"""
+    # UDP没有可靠的"连接"探测，sendto/recvfrom无法区分监听和丢包，
+    # 还会白等1秒超时；直接用bind探测：绑不上说明已有进程在监听
+    return not _udp_bindable(port)
+
+def _alive(pid):
+    """检查进程是否存活：Linux上直接stat /proc/<pid>，比kill(pid, 0)更轻量"""
+    if sys.platform.startswith('linux'):
+        return os.path.exists(f'/proc/{pid}')
     try:
-        # 尝试连接到端口
-        # 由于 Hysteria 使用 UDP，我们检查 UDP 端口
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.settimeout(1)
-        
-        # 尝试发送一个数据包到端口
-        # 如果端口打开，send不会抛出异常
-        try:
-            sock.sendto(b"ping", ('127.0.0.1', port))
-            try:
-                sock.recvfrom(1024)  # 尝试接收响应
-                return True
-            except socket.timeout:
-                # 没收到响应但也没报错，可能仍在监听
-                return True
-        except:
-            pass
-            
-        # 另一种检查方式：尝试绑定端口，如果失败说明端口已被占用
-        try:
-            test_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            test_sock.bind(('', port))
-            test_sock.close()
-            return False  # 能成功绑定说明端口未被占用
-        except:
-            return True  # 无法绑定说明端口已被占用
-            
-        return False
+        os.kill(pid, 0)
+        return True
     except:
         return False
-    finally:
-        try:
-            sock.close()
-        except:
-            pass
+
+# pid文件内容缓存：{pid_file: (mtime, pid)}，文件没变就不重复open+read
+_PID_CACHE = {}
 
 def check_process_running(pid_file):
     """检查进程是否在运行"""
-    if not os.path.exists(pid_file):
+    try:
+        mtime = os.stat(pid_file).st_mtime
+    except OSError:
         return False
-        
+
     try:
-        with open(pid_file, 'r') as f:
-            pid = f.read().strip()
-            
+        cached = _PID_CACHE.get(pid_file)
+        if cached and cached[0] == mtime:
+            pid = cached[1]
+        else:
+            with open(pid_file, 'r') as f:
+                pid = f.read().strip()
+            _PID_CACHE[pid_file] = (mtime, pid)
+
         if not pid:
             return False
-            
-        # 尝试发送信号0检查进程是否存在
-        try:
-            os.kill(int(pid), 0)
-            return True
-        except:
-            return False
+
+        return _alive(int(pid))
     except:
         return False
 
 def create_directories():
     """创建必要的目录"""
-    home = get_user_home()
-    dirs = [
-        f"{home}/.hysteria2",
-        f"{home}/.hysteria2/cert",
-        f"{home}/.hysteria2/config",
-        f"{home}/.hysteria2/logs"
-    ]
-    for d in dirs:
-        os.makedirs(d, exist_ok=True)
-    return dirs[0]
-
-def download_file(url, save_path, max_retries=3):
-    """下载文件，带重试机制"""
+    # 先建根目录，再直接mkdir三个子目录，
+    # 避免os.makedirs对.hysteria2/重复逐级path walk
+    root = Path(get_user_home()) / '.hysteria2'
+    root.mkdir(exist_ok=True)
+    for sub in ('cert', 'config', 'logs'):
+        try:
+            (root / sub).mkdir()
+        except FileExistsError:
+            pass
+    return str(root)
+
+async def _fetch(session, url, save_path):
+    """用aiohttp流式下载单个地址，按64KB块写入本地文件"""
+    async with session.get(url) as resp:
+        resp.raise_for_status()
+        with open(save_path, 'wb') as f:
+            while True:
+                chunk = await resp.content.read(1 << 16)
+                if not chunk:
+                    break
+                f.write(chunk)
+
+async def _download_async(url, save_path, timeout=60):
+    """在单个aiohttp会话里完成流式下载"""
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        await _fetch(session, url, save_path)
+
+async def _race_public_ip(urls, timeout=5):
+    """并发请求多个公网IP接口，谁先返回用谁，其余任务取消"""
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        async def _one(api_url):
+            async with session.get(api_url) as resp:
+                text = (await resp.text()).strip()
+                if not text:
+                    raise ValueError("空响应")
+                return text
+
+        pending = {asyncio.ensure_future(_one(u)) for u in urls}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.exception():
+                        return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+    return None
+
+def _urllib_download(url, save_path):
+    """用urlopen+1MB缓冲流式下载，代替urlretrieve的8KB小块回调
+
+    大缓冲把几MB的二进制从几千次read/write降到几十次；
+    写完fdatasync确保落盘后再做校验。
+    """
+    with _OPENER.open(url, timeout=30) as r, open(save_path, 'wb') as f:
+        shutil.copyfileobj(r, f, length=1024 * 1024)
+        f.flush()
+        os.fdatasync(f.fileno())
+
+def download_file(url, save_path, max_retries=3, backoff_base=2, backoff_cap=30):
+    """下载文件，带重试机制（有aiohttp时走流式下载）
+
+    重试间隔使用指数退避加随机抖动，避免固定间隔反复冲击同一镜像。
+    """
     for i in range(max_retries):
         try:
             print(f"正在下载... (尝试 {i+1}/{max_retries})")
-            urllib.request.urlretrieve(url, save_path)
+            if HAS_AIOHTTP:
+                asyncio.run(_download_async(url, save_path))
+            else:
+                _urllib_download(url, save_path)
             return True
         except Exception as e:
             print(f"下载失败: {e}")
             if i < max_retries - 1:
-                time.sleep(2)  # 等待2秒后重试
+                # 服务器限流时优先遵守Retry-After头
+                delay = None
+                if isinstance(e, urllib.error.HTTPError) and e.code in (429, 503):
+                    retry_after = e.headers.get('Retry-After') if e.headers else None
+                    if retry_after and retry_after.isdigit():
+                        delay = min(backoff_cap, int(retry_after))
+                if delay is None:
+                    # 指数退避 + 抖动：base * 2^i，上限backoff_cap秒
+                    delay = min(backoff_cap, backoff_base * (2 ** i)) * rand_module.uniform(0.5, 1.5)
+                time.sleep(delay)
             continue
     return False
 
+@lru_cache(maxsize=None)
 def get_latest_version():
     """返回固定的最新版本号 v2.6.1"""
     return "v2.6.1"
 
+@lru_cache(maxsize=None)
 def get_download_filename(os_name, arch):
     """根据系统和架构返回正确的文件名"""
     # windows 需要 .exe
@@ -237,17 +323,18 @@ def get_download_filename(os_name, arch):
 def verify_binary(binary_path):
     """验证二进制文件是否有效（简化版）"""
     try:
-        # 检查文件是否存在
-        if not os.path.exists(binary_path):
+        # 一次stat同时拿到存在性和大小（至少5MB - hysteria一般大于10MB）
+        try:
+            st = os.stat(binary_path)
+        except FileNotFoundError:
             return False
-            
-        # 检查文件大小（至少5MB - hysteria一般大于10MB）
-        if os.path.getsize(binary_path) < 5 * 1024 * 1024:
+
+        if st.st_size < 5 * 1024 * 1024:
             return False
-            
+
         # 设置文件为可执行
         os.chmod(binary_path, 0o755)
-        
+
         # 返回成功
         return True
     except:
@@ -271,20 +358,21 @@ def download_hysteria2(base_dir):
         print(f"系统类型: {os_name}, 架构: {arch}, 文件名: {filename}")
         print(f"下载链接: {url}")
         
-        # 使用wget下载
+        # 优先使用aiohttp下载，没有时回退到wget/curl
         try:
-            has_wget = shutil.which('wget') is not None
-            has_curl = shutil.which('curl') is not None
-            
-            if has_wget:
+            if HAS_AIOHTTP:
+                print("使用aiohttp下载...")
+                if not download_file(url, binary_path):
+                    raise Exception("aiohttp下载失败")
+            elif _WGET:
                 print("使用wget下载...")
-                subprocess.run(['wget', '--tries=3', '--timeout=15', '-O', binary_path, url], check=True)
-            elif has_curl:
+                subprocess.run([_WGET, '--tries=3', '--timeout=15', '-O', binary_path, url], check=True)
+            elif _CURL:
                 print("使用curl下载...")
-                subprocess.run(['curl', '-L', '--connect-timeout', '15', '-o', binary_path, url], check=True)
+                subprocess.run([_CURL, '-L', '--connect-timeout', '15', '-o', binary_path, url], check=True)
             else:
                 print("系统无wget/curl，尝试使用Python下载...")
-                urllib.request.urlretrieve(url, binary_path)
+                _urllib_download(url, binary_path)
                 
             # 验证下载
             if not verify_binary(binary_path):
@@ -301,42 +389,67 @@ def download_hysteria2(base_dir):
             print(f"3. 将文件重命名为 hysteria (不要加后缀) 并移动到 {base_dir}/ 目录")
             print(f"4. 执行: chmod +x {base_dir}/hysteria")
             
-            # 询问用户文件是否已放置
-            while True:
-                user_input = input("已完成手动下载和放置? (y/n): ").lower()
-                if user_input == 'y':
-                    # 检查文件是否存在
-                    if os.path.exists(binary_path) and verify_binary(binary_path):
+            # 只确认一次，之后定时轮询等文件就绪，不再无限问答
+            user_input = input("已完成手动下载和放置? (y/n): ").lower()
+            if user_input == 'n':
+                print("中止安装。")
+                sys.exit(1)
+
+            print(f"等待 {binary_path} 就绪（最多10分钟）...")
+            deadline = time.monotonic() + 600
+            last_mtime = None
+            while time.monotonic() < deadline:
+                try:
+                    mtime = os.stat(binary_path).st_mtime
+                except OSError:
+                    mtime = None
+                # 文件出现或内容有更新时才做完整校验，避免反复stat+chmod
+                if mtime is not None and mtime != last_mtime:
+                    last_mtime = mtime
+                    if verify_binary(binary_path):
                         print("文件验证成功，继续安装...")
                         return binary_path, version
-                    else:
-                        print(f"文件不存在或无效，请确保放在 {binary_path} 位置。")
-                elif user_input == 'n':
-                    print("中止安装。")
-                    sys.exit(1)
+                    print(f"文件无效，请确保完整放在 {binary_path} 位置。")
+                time.sleep(5)
+
+            print("等待超时，中止安装。")
+            sys.exit(1)
     
     except Exception as e:
         print(f"下载错误: {e}")
         sys.exit(1)
 
+@lru_cache(maxsize=1)
 def get_ip_address():
-    """获取本机IP地址（优先获取公网IP，如果失败则使用本地IP）"""
-    # 首先尝试获取公网IP
-    try:
-        # 尝试从公共API获取公网IP
-        with urllib.request.urlopen('https://api.ipify.org', timeout=5) as response:
-            public_ip = response.read().decode('utf-8')
-            if public_ip and len(public_ip) > 0:
+    """获取本机IP地址（优先获取公网IP，如果失败则使用本地IP）
+
+    结果在一次运行内缓存：simple/one-click等分支会重复调用，
+    没必要每次都发一轮网络请求。
+    """
+    # 首先尝试获取公网IP：有aiohttp时两个API并发竞速，取最快的结果
+    if HAS_AIOHTTP:
+        try:
+            public_ip = asyncio.run(_race_public_ip(('https://api.ipify.org', 'https://ifconfig.me')))
+            if public_ip:
                 return public_ip
-    except:
+        except:
+            pass
+    else:
         try:
-            # 备选API
-            with urllib.request.urlopen('https://ifconfig.me', timeout=5) as response:
+            # 尝试从公共API获取公网IP
+            with _OPENER.open('https://api.ipify.org', timeout=5) as response:
                 public_ip = response.read().decode('utf-8')
                 if public_ip and len(public_ip) > 0:
                     return public_ip
         except:
-            pass
+            try:
+                # 备选API
+                with _OPENER.open('https://ifconfig.me', timeout=5) as response:
+                    public_ip = response.read().decode('utf-8')
+                    if public_ip and len(public_ip) > 0:
+                        return public_ip
+            except:
+                pass
 
     # 如果获取公网IP失败，尝试获取本地IP
     try:
@@ -376,6 +489,9 @@ def setup_nginx_smart_proxy(base_dir, domain, web_dir, cert_path, key_path, hyst
         nginx_user = ensure_nginx_user()
         print(f"👤 使用nginx用户: {nginx_user}")
         
+        # 证书绝对路径只算一次（os.path.abspath每次都要stat当前目录）
+        cert_abs, key_abs = map(os.path.abspath, (cert_path, key_path))
+
         # 创建nginx标准Web配置 - 修改为使用您开放的端口
         nginx_conf = f"""user {nginx_user};
 worker_processes auto;
@@ -398,10 +514,10 @@ http {{
         listen {hysteria_port} ssl http2;
         server_name _;
         
-        ssl_certificate {os.path.abspath(cert_path)};
-        ssl_certificate_key {os.path.abspath(key_path)};
+        ssl_certificate {cert_abs};
+        ssl_certificate_key {key_abs};
         ssl_protocols TLSv1.2 TLSv1.3;
-        ssl_ciphers ECDHE-RSA-AES128-GCM-SHA256:ECDHE-RSA-AES256-GCM-SHA384;
+        ssl_ciphers ECDHE-ECDSA-AES128-GCM-SHA256:ECDHE-ECDSA-AES256-GCM-SHA384:ECDHE-RSA-AES128-GCM-SHA256:ECDHE-RSA-AES256-GCM-SHA384;
         
         root {web_dir};
         index index.html index.htm;
@@ -418,31 +534,34 @@ http {{
         
         # 更新nginx配置
         print("💾 备份当前nginx配置...")
-        subprocess.run(['sudo', 'cp', '/etc/nginx/nginx.conf', '/etc/nginx/nginx.conf.backup'], check=True)
+        _run(['sudo', 'cp', '/etc/nginx/nginx.conf', '/etc/nginx/nginx.conf.backup'], check=True)
         
-        import tempfile
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.conf') as tmp:
-            tmp.write(nginx_conf)
-            tmp.flush()
-            subprocess.run(['sudo', 'cp', tmp.name, '/etc/nginx/nginx.conf'], check=True)
-            os.unlink(tmp.name)
+        _sudo_write('/etc/nginx/nginx.conf', nginx_conf.encode('utf-8'))
         
-        subprocess.run(['sudo', 'rm', '-f', '/etc/nginx/conf.d/*.conf'], check=True)
+        # rm -f '/etc/nginx/conf.d/*.conf' 不经过shell不会展开通配符，
+        # 以前这一步实际什么都没删；在Python里展开后一次rm删干净
+        stale_confs = glob.glob('/etc/nginx/conf.d/*.conf')
+        if stale_confs:
+            _run(['sudo', 'rm', '-f', *stale_confs], check=True)
         
         # 测试并重启
         print("🔧 测试nginx配置...")
-        test_result = subprocess.run(['sudo', 'nginx', '-t'], capture_output=True, text=True)
+        test_result = _run(['sudo', 'nginx', '-t'], capture_output=True, text=True)
         if test_result.returncode != 0:
             print(f"❌ nginx配置测试失败:")
             print(f"错误信息: {test_result.stderr}")
-            subprocess.run(['sudo', 'cp', '/etc/nginx/nginx.conf.backup', '/etc/nginx/nginx.conf'], check=True)
+            _run(['sudo', 'cp', '/etc/nginx/nginx.conf.backup', '/etc/nginx/nginx.conf'], check=True)
             print("🔄 已恢复nginx配置备份")
             return False, None
         
         print("✅ nginx配置测试通过")
         
-        print("🔄 重启nginx服务...")
-        restart_result = subprocess.run(['sudo', 'systemctl', 'restart', 'nginx'], capture_output=True, text=True)
+        # reload走SIGHUP热加载，不断现有连接也不用重新绑定监听socket；
+        # nginx还没运行时reload会失败，这时才退回restart
+        print("🔄 重载nginx服务...")
+        restart_result = _run(['sudo', 'systemctl', 'reload', 'nginx'], capture_output=True, text=True)
+        if restart_result.returncode != 0:
+            restart_result = _run(['sudo', 'systemctl', 'restart', 'nginx'], capture_output=True, text=True)
         if restart_result.returncode != 0:
             print(f"❌ nginx重启失败:")
             print(f"错误信息: {restart_result.stderr}")
@@ -465,17 +584,8 @@ def create_web_masquerade(base_dir):
     
     return create_web_files_in_directory(web_dir)
 
-def create_web_files_in_directory(web_dir):
-    """在指定目录创建Web文件"""
-    # 确保目录存在
-    if not os.path.exists(web_dir):
-        try:
-            subprocess.run(['sudo', 'mkdir', '-p', web_dir], check=True)
-        except:
-            os.makedirs(web_dir, exist_ok=True)
-    
-    # 创建一个更逼真的企业网站首页
-    index_html = """<!DOCTYPE html>
+# 一个更逼真的企业网站首页（模块级常量，重复安装时不再每次重建大字符串）
+_INDEX_HTML = """<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -659,39 +769,16 @@ def create_web_files_in_directory(web_dir):
      </footer>
  </body>
 </html>"""
-    
-    # 使用sudo写入文件（如果需要）
-    try:
-        with open(f"{web_dir}/index.html", "w", encoding="utf-8") as f:
-            f.write(index_html)
-    except PermissionError:
-        # 使用sudo写入
-        import tempfile
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.html') as tmp:
-            tmp.write(index_html)
-            tmp.flush()
-            subprocess.run(['sudo', 'cp', tmp.name, f"{web_dir}/index.html"], check=True)
-            os.unlink(tmp.name)
-    
-    # 创建robots.txt（看起来更真实）
-    robots_txt = """User-agent: *
+
+# robots.txt（看起来更真实）
+_ROBOTS_TXT = """User-agent: *
 Allow: /
 
 Sitemap: /sitemap.xml
 """
-    try:
-        with open(f"{web_dir}/robots.txt", "w") as f:
-            f.write(robots_txt)
-    except PermissionError:
-        import tempfile
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt') as tmp:
-            tmp.write(robots_txt)
-            tmp.flush()
-            subprocess.run(['sudo', 'cp', tmp.name, f"{web_dir}/robots.txt"], check=True)
-            os.unlink(tmp.name)
-    
-    # 创建sitemap.xml
-    sitemap_xml = """<?xml version="1.0" encoding="UTF-8"?>
+
+# sitemap.xml
+_SITEMAP_XML = """<?xml version="1.0" encoding="UTF-8"?>
 <urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
   <url>
     <loc>/</loc>
@@ -718,17 +805,32 @@ Sitemap: /sitemap.xml
     <priority>0.7</priority>
   </url>
 </urlset>"""
-    try:
-        with open(f"{web_dir}/sitemap.xml", "w") as f:
-            f.write(sitemap_xml)
-    except PermissionError:
-        import tempfile
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.xml') as tmp:
-            tmp.write(sitemap_xml)
-            tmp.flush()
-            subprocess.run(['sudo', 'cp', tmp.name, f"{web_dir}/sitemap.xml"], check=True)
-            os.unlink(tmp.name)
-    
+
+# 模块加载时一次性编码成bytes，写文件走单次write_bytes，不再经过文本模式编码
+_WEB_FILES = {
+    'index.html': _INDEX_HTML.encode('utf-8'),
+    'robots.txt': _ROBOTS_TXT.encode('utf-8'),
+    'sitemap.xml': _SITEMAP_XML.encode('utf-8'),
+}
+
+def create_web_files_in_directory(web_dir):
+    """在指定目录创建Web文件"""
+    # 确保目录存在：父目录可写（典型情况：~/.hysteria2/web）就直接mkdir，
+    # 只有没权限时才值得为sudo多fork一个进程
+    p = Path(web_dir)
+    if not p.exists():
+        if os.access(p.parent, os.W_OK):
+            p.mkdir(parents=True, exist_ok=True)
+        else:
+            _run(['sudo', 'mkdir', '-p', web_dir], check=True)
+
+    for name, data in _WEB_FILES.items():
+        try:
+            Path(f"{web_dir}/{name}").write_bytes(data)
+        except PermissionError:
+            # 没有写权限时使用sudo写入
+            _sudo_write(f"{web_dir}/{name}", data)
+
     return web_dir
 
 def generate_self_signed_cert(base_dir, domain):
@@ -743,101 +845,179 @@ def generate_self_signed_cert(base_dir, domain):
         print("警告: 域名为空，使用localhost作为证书通用名")
     
     try:
-        # 生成更安全的证书
-        subprocess.run([
-            "openssl", "req", "-x509", "-nodes",
-            "-newkey", "rsa:4096",  # 使用4096位密钥
-            "-keyout", key_path,
-            "-out", cert_path,
-            "-subj", f"/CN={domain}",
-            "-days", "36500",
-            "-sha256"  # 使用SHA256
-        ], check=True)
-        
+        if HAS_CRYPTOGRAPHY:
+            # 进程内生成ECDSA P-256证书：密钥生成是微秒级（RSA-4096要数秒），
+            # 还省掉openssl的fork+exec
+            import datetime
+            key = ec.generate_private_key(ec.SECP256R1())
+            name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, domain)])
+            now = datetime.datetime.utcnow()
+            cert = (
+                x509.CertificateBuilder()
+                .subject_name(name)
+                .issuer_name(name)
+                .public_key(key.public_key())
+                .serial_number(x509.random_serial_number())
+                .not_valid_before(now)
+                .not_valid_after(now + datetime.timedelta(days=36500))
+                .sign(key, hashes.SHA256())
+            )
+            with open(key_path, 'wb') as f:
+                f.write(key.private_bytes(
+                    serialization.Encoding.PEM,
+                    serialization.PrivateFormat.PKCS8,
+                    serialization.NoEncryption()))
+            with open(cert_path, 'wb') as f:
+                f.write(cert.public_bytes(serialization.Encoding.PEM))
+        else:
+            # 回退到openssl子进程生成证书
+            _run([
+                "openssl", "req", "-x509", "-nodes",
+                "-newkey", "rsa:4096",  # 使用4096位密钥
+                "-keyout", key_path,
+                "-out", cert_path,
+                "-subj", f"/CN={domain}",
+                "-days", "36500",
+                "-sha256"  # 使用SHA256
+            ], check=True)
+
         # 设置适当的权限
         os.chmod(cert_path, 0o644)
         os.chmod(key_path, 0o600)
-        
+
         return cert_path, key_path
     except Exception as e:
         print(f"生成证书失败: {e}")
         sys.exit(1)
 
-def create_config(base_dir, port, password, cert_path, key_path, domain, enable_web_masquerade=True, custom_web_dir=None, enable_port_hopping=False, obfs_password=None, enable_http3_masquerade=False):
-    """创建Hysteria2配置文件（端口跳跃、混淆、HTTP/3伪装）"""
-    
-    # 基础配置
-    config = {
-        "listen": f":{port}",
-        "tls": {
-            "cert": cert_path,
-            "key": key_path
-        },
-        "auth": {
-            "type": "password",
-            "password": password
-        },
-        "bandwidth": {
-            "up": "1000 mbps",
-            "down": "1000 mbps"
-        },
-        "ignoreClientBandwidth": False,
-        "log": {
-            "level": "warn",
-            "output": f"{base_dir}/logs/hysteria.log",
-            "timestamp": True
-        },
-        "resolver": {
-            "type": "udp",
-            "tcp": {
-                "addr": "8.8.8.8:53",
-                "timeout": "4s"
-            },
-            "udp": {
-                "addr": "8.8.8.8:53", 
-                "timeout": "4s"
-            }
-        }
+# 您服务器防火墙已放行的端口，frozenset做O(1)成员判断
+_ALLOWED_PORTS = frozenset({54116, 17205, 39670})
+
+# 这些配置片段的内容是固定的，做成模块常量，写入config前copy一份保持各配置独立
+_QUIC_CONFIG = {
+    "initStreamReceiveWindow": 8388608,
+    "maxStreamReceiveWindow": 8388608,
+    "initConnReceiveWindow": 20971520,
+    "maxConnReceiveWindow": 20971520,
+    "maxIdleTimeout": "30s",
+    "maxIncomingStreams": 1024,
+    "disablePathMTUDiscovery": False
+}
+
+_MASQ_PROXY_GOOGLE = {
+    "type": "proxy",
+    "proxy": {
+        "url": "https://www.google.com",
+        "rewriteHost": True
     }
-    
+}
+
+_MASQ_PROXY_MS = {
+    "type": "proxy",
+    "proxy": {
+        "url": "https://www.microsoft.com",
+        "rewriteHost": True
+    }
+}
+
+# 非常用端口时随机挑一个伪装站点（模块级元组，不用每次调用重建列表）
+_MASQUERADE_SITES = (
+    "https://www.microsoft.com",
+    "https://www.apple.com",
+    "https://www.amazon.com",
+    "https://www.github.com",
+    "https://www.stackoverflow.com"
+)
+
+# 端口 -> 伪装配置查表，一次get替代逐个端口比较；未命中的端口走随机伪装站点
+_MASQ_BY_PORT = {
+    80: _MASQ_PROXY_MS,
+    443: _MASQ_PROXY_MS,
+    8080: _MASQ_PROXY_MS,
+    8443: _MASQ_PROXY_MS
+}
+
+# 安装目录下反复用到的几个路径，开头算一份传下去，不再到处f-string重拼
+Paths = namedtuple("Paths", "config_json pid log")
+
+def _install_paths(base_dir):
+    """一次性计算安装目录下的常用路径"""
+    return Paths(
+        f"{base_dir}/config/config.json",
+        f"{base_dir}/hysteria.pid",
+        f"{base_dir}/logs/hysteria.log",
+    )
+
+@lru_cache(maxsize=None)
+def _detect_resolver():
+    """选择离服务器最近的DNS解析器
+
+    优先systemd-resolved的本地stub（缓存命中<1ms），其次/etc/resolv.conf里
+    配置的第一个非回环nameserver，都没有才退到1.1.1.1 anycast——
+    比写死8.8.8.8少一跳出网RTT，每个客户端连接的建连都受益。
+    """
+    if os.path.exists('/run/systemd/resolve/resolv.conf'):
+        return '127.0.0.53:53'
+    try:
+        with open('/etc/resolv.conf') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == 'nameserver':
+                    ns = parts[1]
+                    if not ns.startswith('127.') and ':' not in ns:
+                        return f'{ns}:53'
+    except OSError:
+        pass
+    return '1.1.1.1:53'
+
+def create_config(base_dir, port, password, cert_path, key_path, domain, *, enable_web_masquerade=True, custom_web_dir=None, enable_port_hopping=False, obfs_password=None, enable_http3_masquerade=False, pretty_config=False, paths=None):
+    """创建Hysteria2配置文件（端口跳跃、混淆、HTTP/3伪装）
+
+    开关参数全部keyword-only，调用处必须写明参数名，避免布尔位置参数传错位。
+    """
+
+    paths = paths or _install_paths(base_dir)
+    resolver_addr = _detect_resolver()
+
+    # 各可选段先算好，最后一次dict字面量拼出完整配置，不再对config逐键赋值
+
     # 端口跳跃配置 (Port Hopping)
+    port_hopping = None
     if enable_port_hopping:
         # Hysteria2服务器端只监听单个端口，端口跳跃通过iptables DNAT实现
-        port_start = max(1024, port - 25)  
+        port_start = max(1024, port - 25)
         port_end = min(65535, port + 25)
-        
+
         # 确保范围合理：如果基准端口太小，使用固定范围
         if port < 1049:  # 1024 + 25
             port_start = 1024
             port_end = 1074
-        
-        # 服务器仍然只监听单个端口
-        config["listen"] = f":{port}"
-        
+
         # 记录端口跳跃信息，用于后续iptables配置
-        config["_port_hopping"] = {
+        port_hopping = {
             "enabled": True,
             "range_start": port_start,
             "range_end": port_end,
             "listen_port": port
         }
-        
+
         print(f"✅ 启用端口跳跃 - 服务器监听: {port}, 客户端可用范围: {port_start}-{port_end}")
-    
+
     # 流量混淆配置 (Salamander Obfuscation)
+    obfs = None
     if obfs_password:
-        config["obfs"] = {
+        obfs = {
             "type": "salamander",
             "salamander": {
                 "password": obfs_password
             }
         }
         print(f"✅ 启用Salamander混淆 - 密码: {obfs_password}")
-    
+
     # HTTP/3伪装配置
     if enable_http3_masquerade:
         if enable_web_masquerade and custom_web_dir and os.path.exists(custom_web_dir):
-            config["masquerade"] = {
+            masquerade = {
                 "type": "file",
                 "file": {
                     "dir": custom_web_dir
@@ -845,78 +1025,91 @@ def create_config(base_dir, port, password, cert_path, key_path, domain, enable_
             }
         else:
             # 使用HTTP/3网站伪装
-            config["masquerade"] = {
-                "type": "proxy",
-                "proxy": {
-                    "url": "https://www.google.com",
-                    "rewriteHost": True
-                }
-            }
+            masquerade = dict(_MASQ_PROXY_GOOGLE)
         print("✅ 启用HTTP/3伪装 - 流量看起来像正常HTTP/3")
     elif enable_web_masquerade and custom_web_dir and os.path.exists(custom_web_dir):
-        config["masquerade"] = {
+        masquerade = {
             "type": "file",
             "file": {
                 "dir": custom_web_dir
             }
         }
-    elif port in [80, 443, 8080, 8443]:
-        config["masquerade"] = {
-            "type": "proxy",
-            "proxy": {
-                "url": "https://www.microsoft.com",
-                "rewriteHost": True
-            }
-        }
     else:
-        masquerade_sites = [
-            "https://www.microsoft.com",
-            "https://www.apple.com", 
-            "https://www.amazon.com",
-            "https://www.github.com",
-            "https://www.stackoverflow.com"
-        ]
-        config["masquerade"] = {
+        masq = _MASQ_BY_PORT.get(port)
+        masquerade = dict(masq) if masq else {
             "type": "proxy",
             "proxy": {
-                "url": rand_module.choice(masquerade_sites),
+                "url": rand_module.choice(_MASQUERADE_SITES),
                 "rewriteHost": True
             }
         }
-    
-    # QUIC/HTTP3优化配置 - 修改为您开放的端口
-    if port in [54116, 17205, 39670]:  # 使用您的开放端口之一
-        config["quic"] = {
-            "initStreamReceiveWindow": 8388608,
-            "maxStreamReceiveWindow": 8388608,
-            "initConnReceiveWindow": 20971520,
-            "maxConnReceiveWindow": 20971520,
-            "maxIdleTimeout": "30s",
-            "maxIncomingStreams": 1024,
-            "disablePathMTUDiscovery": False
-        }
-    
-    config_path = f"{base_dir}/config/config.json"
-    with open(config_path, "w") as f:
-        json.dump(config, f, indent=2)
-    
+
+    config = {
+        "listen": f":{port}",
+        "tls": {
+            "cert": cert_path,
+            "key": key_path
+        },
+        "auth": {
+            "type": "password",
+            "password": password
+        },
+        "bandwidth": {
+            "up": "1000 mbps",
+            "down": "1000 mbps"
+        },
+        "ignoreClientBandwidth": False,
+        "log": {
+            "level": "warn",
+            "output": paths.log,
+            "timestamp": True
+        },
+        "resolver": {
+            "type": "udp",
+            "tcp": {
+                "addr": resolver_addr,
+                "timeout": "2s"
+            },
+            "udp": {
+                "addr": resolver_addr,
+                "timeout": "2s"
+            }
+        },
+        "masquerade": masquerade,
+        # QUIC/HTTP3优化配置只在您的开放端口上启用
+        **({"quic": dict(_QUIC_CONFIG)} if port in _ALLOWED_PORTS else {}),
+        **({"obfs": obfs} if obfs else {}),
+        **({"_port_hopping": port_hopping} if port_hopping else {})
+    }
+
+    config_path = paths.config_json
+    # 一次性序列化成bytes再单次写入，不走json.dump的逐块文本输出；
+    # 配置只给hysteria进程读，默认紧凑输出，需要人看时加--pretty-config
+    if HAS_ORJSON:
+        data = orjson.dumps(config, option=orjson.OPT_INDENT_2 if pretty_config else 0)
+    else:
+        if pretty_config:
+            data = json.dumps(config, indent=2).encode('utf-8')
+        else:
+            data = json.dumps(config, separators=(",", ":")).encode('utf-8')
+    # 直接走fd写入，跳过io.TextIOWrapper/BufferedWriter那套缓冲链
+    fd = os.open(config_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+
     return config_path
 
-def create_service_script(base_dir, binary_path, config_path, port):
-    """创建启动脚本"""
-    os_name = platform.system().lower()
-    pid_file = f"{base_dir}/hysteria.pid"
-    log_file = f"{base_dir}/logs/hysteria.log"
-    
-    if os_name == 'windows':
-        script_content = f"""@echo off
+# 启动/停止脚本的静态模板：模块级普通字符串 + format_map填充，
+# 每次安装只做占位符替换，不再重新拼整个f-string
+_START_BAT_TMPL = """@echo off
 echo 正在启动 Hysteria2 服务...
 start /b {binary_path} server -c {config_path} > {log_file} 2>&1
 echo 启动命令已执行，请检查日志以确认服务状态
 """
-        script_path = f"{base_dir}/start.bat"
-    else:
-        script_content = f"""#!/bin/bash
+
+_START_SH_TMPL = """#!/bin/bash
 echo "正在启动 Hysteria2 服务..."
 
 # 检查二进制文件是否存在
@@ -940,31 +1133,16 @@ echo "Hysteria2 服务已启动，PID: $(cat {pid_file})"
 sleep 2
 echo "启动命令已执行，请检查日志以确认服务状态"
 """
-        script_path = f"{base_dir}/start.sh"
-    
-    with open(script_path, "w") as f:
-        f.write(script_content)
-    
-    if os_name != 'windows':
-        os.chmod(script_path, 0o755)
-    
-    return script_path
 
-def create_stop_script(base_dir):
-    """创建停止脚本"""
-    os_name = platform.system().lower()
-    
-    if os_name == 'windows':
-        script_content = f"""@echo off
+_STOP_BAT_TMPL = """@echo off
 for /f "tokens=*" %%a in ('type {base_dir}\\hysteria.pid') do (
     taskkill /F /PID %%a
 )
 del {base_dir}\\hysteria.pid
 echo Hysteria2 服务已停止
 """
-        script_path = f"{base_dir}/stop.bat"
-    else:
-        script_content = f"""#!/bin/bash
+
+_STOP_SH_TMPL = """#!/bin/bash
 if [ -f {base_dir}/hysteria.pid ]; then
     kill $(cat {base_dir}/hysteria.pid)
     rm {base_dir}/hysteria.pid
@@ -973,9 +1151,48 @@ else
     echo "Hysteria2 服务未运行"
 fi
 """
+
+def create_service_script(base_dir, binary_path, config_path, port, paths=None):
+    """创建启动脚本"""
+    os_name = _OS_NAME
+    paths = paths or _install_paths(base_dir)
+    fields = {
+        'binary_path': binary_path,
+        'config_path': config_path,
+        'log_file': paths.log,
+        'pid_file': paths.pid,
+    }
+
+    if os_name == 'windows':
+        script_content = _START_BAT_TMPL.format_map(fields)
+        script_path = f"{base_dir}/start.bat"
+    else:
+        script_content = _START_SH_TMPL.format_map(fields)
+        script_path = f"{base_dir}/start.sh"
+    
+    # 64KB缓冲 + 一次write，整个脚本单次flush落盘
+    with open(script_path, "w", buffering=65536) as f:
+        f.write(script_content)
+    
+    if os_name != 'windows':
+        os.chmod(script_path, 0o755)
+    
+    return script_path
+
+def create_stop_script(base_dir):
+    """创建停止脚本"""
+    os_name = _OS_NAME
+    fields = {'base_dir': base_dir}
+
+    if os_name == 'windows':
+        script_content = _STOP_BAT_TMPL.format_map(fields)
+        script_path = f"{base_dir}/stop.bat"
+    else:
+        script_content = _STOP_SH_TMPL.format_map(fields)
         script_path = f"{base_dir}/stop.sh"
     
-    with open(script_path, "w") as f:
+    # 64KB缓冲 + 一次write，整个脚本单次flush落盘
+    with open(script_path, "w", buffering=65536) as f:
         f.write(script_content)
     
     if os_name != 'windows':
@@ -983,6 +1200,70 @@ fi
     
     return script_path
 
+# URL里本来就不需要转义的字符集；密码通常全是安全字符，
+# 先用正则判断一下就能跳过urllib.parse.quote的逐字符处理
+_SAFE_RE = re.compile(r"[A-Za-z0-9._~\-]+")
+
+def _qs(s):
+    """URL参数转义：全是安全字符时原样返回，否则走quote"""
+    return s if _SAFE_RE.fullmatch(s) else urllib.parse.quote(s)
+
+# 启动横幅和帮助文本是纯静态内容，预先构建好，
+# 输出时sys.stdout.write一次写完而不是多次print
+_BANNER = """
+🎯 修改版说明：
+本版本已修改为适配您的服务器开放端口：
+- 默认端口：17205 (可选：54116, 39670)
+- nginx HTTPS监听端口：动态配置
+- 请确保防火墙已开放这些端口的TCP和UDP
+
+可用的开放端口：
+1. 17205 (新默认推荐)
+2. 54116 (备选)
+3. 39670 (备选)
+
+使用示例：
+python3 nginx-hysteria2-fixed.py install --port 17205 --simple
+python3 nginx-hysteria2-fixed.py install --port 54116 --one-click
+python3 nginx-hysteria2-fixed.py install --port 39670 --obfs-password mykey123
+
+"""
+
+_HELP_TEXT = """
+🛡️ Hysteria2 修改版一键部署工具
+
+本版本已针对您的服务器开放端口进行优化：
+- 支持的端口: 17205, 54116, 39670
+- 默认端口: 17205
+
+使用方法:
+    python3 nginx-hysteria2-fixed.py [命令] [选项]
+
+可用命令:
+    install      安装 Hysteria2
+    help         显示此帮助信息
+
+主要选项:
+    --port PORT           指定端口 (17205/54116/39670)
+    --password PWD        指定密码
+    --simple              简化一键部署 (推荐)
+    --one-click           完整一键部署 (所有功能)
+    --obfs-password PWD   启用流量混淆
+    --port-hopping        启用端口跳跃
+    --http3-masquerade    启用HTTP/3伪装
+
+示例:
+    # 使用默认端口17205进行简化部署
+    python3 nginx-hysteria2-fixed.py install --simple
+
+    # 使用端口54116进行完整部署
+    python3 nginx-hysteria2-fixed.py install --port 54116 --one-click
+
+    # 使用端口39670进行自定义部署
+    python3 nginx-hysteria2-fixed.py install --port 39670 --obfs-password mykey123
+
+"""
+
 def main():
     parser = argparse.ArgumentParser(description='Hysteria2 一键部署工具（修改版 - 适配开放端口）')
     parser.add_argument('command', nargs='?', default='install',
@@ -1014,37 +1295,24 @@ def main():
                       help='指定端口跳跃范围 (格式: 起始端口-结束端口，如: 28888-29999)')
     parser.add_argument('--enable-bbr', action='store_true',
                       help='启用BBR拥塞控制算法优化网络性能')
+    parser.add_argument('--pretty-config', action='store_true',
+                      help='配置文件输出带缩进（默认紧凑格式）')
     
     args = parser.parse_args()
-    
-    print("""
-🎯 修改版说明：
-本版本已修改为适配您的服务器开放端口：
-- 默认端口：17205 (可选：54116, 39670)
-- nginx HTTPS监听端口：动态配置
-- 请确保防火墙已开放这些端口的TCP和UDP
 
-可用的开放端口：
-1. 17205 (新默认推荐)
-2. 54116 (备选)
-3. 39670 (备选)
+    sys.stdout.write(_BANNER)
 
-使用示例：
-python3 nginx-hysteria2-fixed.py install --port 17205 --simple
-python3 nginx-hysteria2-fixed.py install --port 54116 --one-click
-python3 nginx-hysteria2-fixed.py install --port 39670 --obfs-password mykey123
-""")
-    
     if args.command == 'install':
         # 验证端口是否在允许的范围内
-        allowed_ports = [54116, 17205, 39670]
-        if args.port not in allowed_ports:
+        if args.port not in _ALLOWED_PORTS:
             print(f"⚠️ 警告：端口 {args.port} 不在您的开放端口列表中")
-            print(f"建议使用开放端口：{allowed_ports}")
-            user_confirm = input("是否继续使用此端口？(y/N): ").lower()
-            if user_confirm != 'y':
-                print("已取消安装")
-                return
+            print(f"建议使用开放端口：{sorted(_ALLOWED_PORTS)}")
+            # 非交互环境（管道/脚本调用）下input()会卡死，只告警不阻塞
+            if sys.stdin.isatty():
+                user_confirm = input("是否继续使用此端口？(y/N): ").lower()
+                if user_confirm != 'y':
+                    print("已取消安装")
+                    return
         
         # 简化一键部署
         if args.simple:
@@ -1055,7 +1323,7 @@ python3 nginx-hysteria2-fixed.py install --port 39670 --obfs-password mykey123
             # 设置默认参数
             args.port_hopping = True
             if not args.obfs_password:
-                args.obfs_password = "simple" + str(rand_module.randint(1000, 9999))
+                args.obfs_password = f"simple{secrets.randbelow(9000) + 1000}"
             args.http3_masquerade = True
             
         # 一键部署逻辑
@@ -1065,8 +1333,8 @@ python3 nginx-hysteria2-fixed.py install --port 39670 --obfs-password mykey123
             args.http3_masquerade = True
             if not args.obfs_password:
                 # 生成随机混淆密码
-                import string
-                args.obfs_password = ''.join(rand_module.choices(string.ascii_letters + string.digits, k=16))
+                # token_urlsafe一次C调用生成16字符URL安全串，熵也比random好
+                args.obfs_password = secrets.token_urlsafe(12)
                 print(f"🔒 自动生成混淆密码: {args.obfs_password}")
         
         # 获取基本配置
@@ -1082,10 +1350,13 @@ python3 nginx-hysteria2-fixed.py install --port 39670 --obfs-password mykey123
         else:
             server_address = args.ip if args.ip else get_ip_address()
         
-        print(f"\n开始安装 Hysteria2（修改版 - 适配开放端口）...")
-        print(f"服务器地址: {server_address}")
-        print(f"端口: {port} ({'您的开放端口' if port in allowed_ports else '自定义端口'})")
-        print(f"证书类型: {'真实证书' if use_real_cert else '自签名证书'}")
+        # 安装前概要一次性写出，避免多次print的逐行flush
+        sys.stdout.write(
+            f"\n开始安装 Hysteria2（修改版 - 适配开放端口）...\n"
+            f"服务器地址: {server_address}\n"
+            f"端口: {port} ({'您的开放端口' if port in _ALLOWED_PORTS else '自定义端口'})\n"
+            f"证书类型: {'真实证书' if use_real_cert else '自签名证书'}\n"
+        )
         
         # 检查端口
         if not check_port_available(port):
@@ -1094,6 +1365,7 @@ python3 nginx-hysteria2-fixed.py install --port 39670 --obfs-password mykey123
         
         # 创建目录
         base_dir = create_directories()
+        P = _install_paths(base_dir)
         
         # 下载Hysteria2
         binary_path, version = download_hysteria2(base_dir)
@@ -1110,12 +1382,17 @@ python3 nginx-hysteria2-fixed.py install --port 39670 --obfs-password mykey123
         cert_path, key_path = generate_self_signed_cert(base_dir, server_address)
         
         # 创建配置
-        config_path = create_config(base_dir, port, password, cert_path, key_path, 
-                                  server_address, args.web_masquerade, web_dir, 
-                                  args.port_hopping, args.obfs_password, args.http3_masquerade)
+        config_path = create_config(base_dir, port, password, cert_path, key_path,
+                                  server_address,
+                                  enable_web_masquerade=args.web_masquerade,
+                                  custom_web_dir=web_dir,
+                                  enable_port_hopping=args.port_hopping,
+                                  obfs_password=args.obfs_password,
+                                  enable_http3_masquerade=args.http3_masquerade,
+                                  pretty_config=args.pretty_config, paths=P)
         
         # 创建启动脚本
-        start_script = create_service_script(base_dir, binary_path, config_path, port)
+        start_script = create_service_script(base_dir, binary_path, config_path, port, paths=P)
         
         # 创建停止脚本
         stop_script = create_stop_script(base_dir)
@@ -1134,87 +1411,59 @@ python3 nginx-hysteria2-fixed.py install --port 39670 --obfs-password mykey123
         # 生成客户端配置链接
         insecure_param = "0" if use_real_cert else "1"
         
-        # 构建链接参数
-        params = [f"insecure={insecure_param}", f"sni={server_address}"]
-        
-        # 添加混淆参数
-        if args.obfs_password:
-            params.append(f"obfs=salamander")
-            params.append(f"obfs-password={urllib.parse.quote(args.obfs_password)}")
-        
-        config_link = f"hysteria2://{urllib.parse.quote(password)}@{server_address}:{port}?{'&'.join(params)}"
+        # 一次性构建链接参数（混淆参数按条件展开进元组，不走append）
+        params = (
+            f"insecure={insecure_param}",
+            f"sni={server_address}",
+            *((f"obfs=salamander", f"obfs-password={_qs(args.obfs_password)}")
+              if args.obfs_password else ()),
+        )
+        config_link = f"hysteria2://{_qs(password)}@{server_address}:{port}?" + "&".join(params)
         
-        print(f"""
-🎉 Hysteria2 修改版安装成功！
-
-📋 安装信息:
-- 版本: {version}
-- 服务器: {server_address}
-- 端口: {port} ({'开放端口' if port in allowed_ports else '自定义端口'})
-- 密码: {password}
-- 安装目录: {base_dir}
-
-🚀 使用方法:
-1. 启动服务: {start_script}
-2. 停止服务: {stop_script}
-3. 查看日志: {base_dir}/logs/hysteria.log
-
-🔗 客户端配置链接:
-{config_link}
-
-🛡️ 防护特性:
-{'✅ 端口跳跃: 已启用' if args.port_hopping else '❌ 端口跳跃: 未启用'}
-{'✅ Salamander混淆: ' + args.obfs_password if args.obfs_password else '❌ 混淆: 未启用'}
-{'✅ HTTP/3伪装: 已启用' if args.http3_masquerade else '❌ HTTP/3伪装: 未启用'}
-{'✅ nginx Web伪装: 已配置' if nginx_success else '❌ nginx Web伪装: 未配置'}
-
-⚠️ 重要提醒:
-- 确保防火墙已开放TCP和UDP端口 {port}
-- nginx Web伪装访问: https://{server_address}:{port}
-- Hysteria2使用UDP协议，客户端连接端口 {port}
-
-💡 测试连接:
-curl -k https://{server_address}:{port}  # 测试nginx Web伪装
-
-🎯 针对您的服务器优化完成！
-端口 {port} 已配置为同时支持TCP(Web伪装)和UDP(Hysteria2代理)
-""")
+        # 整份安装报告先在内存里拼好，再一次write输出
+        # （stdout接了tee/日志收集时避免多次小块write）
+        report = "\n".join((
+            "",
+            "🎉 Hysteria2 修改版安装成功！",
+            "",
+            "📋 安装信息:",
+            f"- 版本: {version}",
+            f"- 服务器: {server_address}",
+            f"- 端口: {port} ({'开放端口' if port in _ALLOWED_PORTS else '自定义端口'})",
+            f"- 密码: {password}",
+            f"- 安装目录: {base_dir}",
+            "",
+            "🚀 使用方法:",
+            f"1. 启动服务: {start_script}",
+            f"2. 停止服务: {stop_script}",
+            f"3. 查看日志: {P.log}",
+            "",
+            "🔗 客户端配置链接:",
+            config_link,
+            "",
+            "🛡️ 防护特性:",
+            '✅ 端口跳跃: 已启用' if args.port_hopping else '❌ 端口跳跃: 未启用',
+            '✅ Salamander混淆: ' + args.obfs_password if args.obfs_password else '❌ 混淆: 未启用',
+            '✅ HTTP/3伪装: 已启用' if args.http3_masquerade else '❌ HTTP/3伪装: 未启用',
+            '✅ nginx Web伪装: 已配置' if nginx_success else '❌ nginx Web伪装: 未配置',
+            "",
+            "⚠️ 重要提醒:",
+            f"- 确保防火墙已开放TCP和UDP端口 {port}",
+            f"- nginx Web伪装访问: https://{server_address}:{port}",
+            f"- Hysteria2使用UDP协议，客户端连接端口 {port}",
+            "",
+            "💡 测试连接:",
+            f"curl -k https://{server_address}:{port}  # 测试nginx Web伪装",
+            "",
+            "🎯 针对您的服务器优化完成！",
+            f"端口 {port} 已配置为同时支持TCP(Web伪装)和UDP(Hysteria2代理)",
+            "",
+        ))
+        sys.stdout.write(report + "\n")
     
     elif args.command == 'help':
-        print("""
-🛡️ Hysteria2 修改版一键部署工具
-
-本版本已针对您的服务器开放端口进行优化：
-- 支持的端口: 17205, 54116, 39670
-- 默认端口: 17205
-
-使用方法:
-    python3 nginx-hysteria2-fixed.py [命令] [选项]
+        sys.stdout.write(_HELP_TEXT)
 
-可用命令:
-    install      安装 Hysteria2
-    help         显示此帮助信息
-
-主要选项:
-    --port PORT           指定端口 (17205/54116/39670)
-    --password PWD        指定密码
-    --simple              简化一键部署 (推荐)
-    --one-click           完整一键部署 (所有功能)
-    --obfs-password PWD   启用流量混淆
-    --port-hopping        启用端口跳跃
-    --http3-masquerade    启用HTTP/3伪装
-
-示例:
-    # 使用默认端口17205进行简化部署
-    python3 nginx-hysteria2-fixed.py install --simple
-    
-    # 使用端口54116进行完整部署
-    python3 nginx-hysteria2-fixed.py install --port 54116 --one-click
-    
-    # 使用端口39670进行自定义部署
-    python3 nginx-hysteria2-fixed.py install --port 39670 --obfs-password mykey123
-""")
-    
     else:
         print(f"未知命令: {args.command}")
         print("可用命令: install, help")